@@ -1,15 +1,229 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
 import numpy as np
 import io
+import csv
+import json
+
+# Serialize figures with orjson (C-level NumPy support) when available
+try:
+    import orjson
+    pio.json.config.default_engine = 'orjson'
+except (ImportError, ValueError):
+    orjson = None
+
+# Numba is optional: fall back to plain NumPy when it isn't installed
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _project_batch(rates, targets):
+        """JIT-compiled backward projection for a batch of targets."""
+        n_stages = rates.size + 1
+        out = np.empty((targets.size, n_stages))
+        for t in prange(targets.size):
+            out[t, n_stages - 1] = targets[t]
+            for i in range(n_stages - 1, 0, -1):
+                rate = rates[i - 1]
+                if rate > 0:
+                    out[t, i - 1] = out[t, i] * (100.0 / rate)
+                else:
+                    out[t, i - 1] = 0.0
+        return out
+else:
+    def _project_batch(rates, targets):
+        """NumPy fallback for the backward projection over a batch of targets."""
+        # The inner np.where keeps the divisor finite so zero rates
+        # don't trigger a divide-by-zero warning
+        safe = rates > 0
+        inverses = np.where(safe, 100.0 / np.where(safe, rates, 1.0), 0.0)
+        factors = np.cumprod(inverses[::-1])[::-1]
+        out = np.empty((targets.size, rates.size + 1))
+        out[:, -1] = targets
+        out[:, :-1] = targets[:, None] * factors[None, :]
+        return out
+
+# Upper bound for the precomputed projection batch; targets up to this
+# are answered by a row lookup, larger ones go through the kernel directly
+_MAX_TARGET = 500
+
+@st.cache_data(show_spinner=False)
+def _all_projections(rates_values, max_target):
+    """Project every integer target from 1 to max_target in one batch."""
+    rates_array = np.asarray(rates_values, dtype=np.float64)
+    targets = np.arange(1, max_target + 1, dtype=np.float64)
+    return _project_batch(rates_array, targets)
+
+def _hash_array(arr):
+    """Hash a NumPy array for cache keying via pandas' C-level hasher.
+
+    The element hashes are weighted by position before combining so that
+    reordered rows or swapped columns never collide, and the shape and
+    dtype are folded in to distinguish reshaped views of the same buffer.
+    """
+    contiguous = np.ascontiguousarray(arr)
+    flat = contiguous.ravel()
+    positions = np.arange(1, flat.size + 1, dtype=np.uint64)
+    digest = int((pd.util.hash_array(flat) * positions).sum())
+    return hash((contiguous.shape, contiguous.dtype.str, digest))
+
+@st.cache_data(show_spinner=False)
+def _parse_upload(raw_bytes, stages):
+    """Parse uploaded CSV bytes into the structure-of-arrays dict.
+
+    Cached on the raw bytes and the stages tuple so the pyarrow parse and
+    array conversions run once per upload, not on every script rerun.
+    """
+    # Parse only the columns we need with Arrow's multithreaded reader
+    df = pd.read_csv(
+        io.BytesIO(raw_bytes),
+        engine='pyarrow',
+        usecols=['Year'] + list(stages),
+        dtype_backend='pyarrow'
+    )
+    # Counts are small integers, so float32/int32 halve the bytes
+    # every downstream reduction and serialization touches
+    return {
+        'year': df['Year'].to_numpy(dtype=np.int32),
+        'stages_matrix': df[list(stages)].to_numpy(dtype=np.float32, copy=True),
+        'stage_names': tuple(stages),
+    }
+
+@st.cache_data(show_spinner=False, hash_funcs={np.ndarray: _hash_array})
+def _conv_rates(stages_matrix, stages):
+    """Calculate conversion rates between recruitment stages.
+
+    Cached on the stage-volume matrix and the stages tuple so the rates
+    are computed once per upload instead of on every rerun.
+    """
+    if stages_matrix is None or len(stages) < 2:
+        return {}
+
+    # Single NumPy reduction instead of two Series.mean() calls per transition.
+    # nanmean tolerates missing rows, and the inner np.where keeps the divisor
+    # finite so no FP warning fires for zero-volume stages
+    means = np.nanmean(stages_matrix, axis=0)
+    numerators, denominators = means[1:], means[:-1]
+    safe = denominators > 0
+    rate_values = np.where(
+        safe, numerators / np.where(safe, denominators, 1.0) * 100.0, 0.0
+    )
+
+    rate_names = [f"{a} to {b}" for a, b in zip(stages, stages[1:])]
+    return dict(zip(rate_names, rate_values.tolist()))
+
+@st.cache_data(show_spinner=False)
+def _rates_html(rates_items):
+    """Render the conversion-rate metrics as a static HTML block.
+
+    The metrics are drawn client-side from an embedded JSON blob instead
+    of one st.metric widget per transition, replacing that many widget
+    diffs per rerun with a single cached component.
+    """
+    rates = dict(rates_items)
+    rates_json = (orjson.dumps(rates).decode() if orjson is not None
+                  else json.dumps(rates))
+    # Escape '</' so a stage name containing '</script>' can't terminate
+    # the inline script tag
+    rates_json = rates_json.replace('</', r'<\/')
+    return f"""
+<style>
+#rates {{
+    font-family: 'Source Sans Pro', sans-serif;
+    color: rgb(49, 51, 63);
+}}
+@media (prefers-color-scheme: dark) {{
+    #rates {{ color: rgb(250, 250, 250); }}
+}}
+</style>
+<div id="rates"></div>
+<script>
+const rates = {rates_json};
+const container = document.getElementById('rates');
+for (const [name, value] of Object.entries(rates)) {{
+    const label = document.createElement('div');
+    label.textContent = name;
+    label.style.cssText = 'font-size: 14px;';
+    const metric = document.createElement('div');
+    // NaN rates arrive as null (orjson) or NaN (stdlib json)
+    metric.textContent = Number.isFinite(value) ? value.toFixed(2) + '%' : 'N/A';
+    metric.style.cssText = 'font-size: 28px; margin-bottom: 12px;';
+    container.appendChild(label);
+    container.appendChild(metric);
+}}
+</script>
+"""
+
+@st.cache_resource(show_spinner=False, hash_funcs={np.ndarray: _hash_array})
+def _build_historical_fig(year, stages_matrix, stages):
+    """Build the historical line chart, cached on the data and stages."""
+    # Historical Data Line Chart (WebGL traces render faster than SVG)
+    historical_fig = go.Figure([
+        go.Scattergl(
+            x=year,
+            y=stages_matrix[:, i],
+            mode='lines+markers',
+            name=stage
+        )
+        for i, stage in enumerate(stages)
+    ])
+    historical_fig.update_layout(
+        title='Recruitment Pipeline Changes Over Time',
+        xaxis_title='Year',
+        yaxis_title='Number of Candidates',
+        legend_title_text='Stage'
+    )
+
+    # Update x-axis to show every 1 year
+    historical_fig.update_xaxes(
+        tick0=year.min(), # Starting point for the ticks
+        dtick=1 # Interval between ticks (1 year)
+        )
+
+    historical_fig.update_yaxes(
+        dtick=200,
+        tickcolor="white",
+        gridcolor = "grey"
+        )
+
+    return historical_fig
+
+@st.cache_resource(show_spinner=False)
+def _build_projection_fig(projection_items):
+    """Build the projection bar chart, cached on the projected volumes."""
+    # Projection Bar Chart, fed straight from the projection pairs
+    projection_fig = go.Figure(go.Bar(
+        x=[stage for stage, _ in projection_items],
+        y=[volume for _, volume in projection_items]
+    ))
+    projection_fig.update_layout(
+        title='Projected Recruitment Pipeline',
+        xaxis_title='Stage',
+        yaxis_title='Number of Candidates'
+    )
+
+    projection_fig.update_yaxes(
+        tickcolor="white",
+        gridcolor = "grey"
+        )
+
+    return projection_fig
 
 class FlexibleRecruitmentPipelineTool:
     def __init__(self):
         # Initialize session state for historical data and stages
+        # Historical data is kept as a dict of NumPy arrays (year vector,
+        # rows x stages matrix) rather than a DataFrame: cheaper to pickle
+        # between reruns and reductions run over one contiguous buffer
         if 'historical_data' not in st.session_state:
             st.session_state.historical_data = None
-        
+
         # Default stages if none are specified
         if 'interview_stages' not in st.session_state:
             st.session_state.interview_stages = [
@@ -38,23 +252,28 @@ class FlexibleRecruitmentPipelineTool:
             key="stage_count"
         )
         
-        # Dynamic stage name inputs
-        new_stages = []
-        for i in range(num_stages):
-            default_stage = (st.session_state.interview_stages[i] 
-                             if i < len(st.session_state.interview_stages) 
-                             else f"Stage {i+1}")
-            stage_name = st.sidebar.text_input(
-                f"Name for Stage {i+1}", 
-                value=default_stage,
-                key=f"stage_input_{i}"
-            )
-            new_stages.append(stage_name)
-        
-        # Save updated stages
-        st.session_state.interview_stages = new_stages
-        
-        return new_stages
+        # Dynamic stage name inputs, batched in a form so the widgets only
+        # round-trip to the server on submit instead of on every rerun
+        with st.sidebar.form("stages_cfg"):
+            new_stages = []
+            for i in range(num_stages):
+                default_stage = (st.session_state.interview_stages[i]
+                                 if i < len(st.session_state.interview_stages)
+                                 else f"Stage {i+1}")
+                stage_name = st.text_input(
+                    f"Name for Stage {i+1}",
+                    value=default_stage,
+                    key=f"stage_input_{i}"
+                )
+                new_stages.append(stage_name)
+
+            submitted = st.form_submit_button("Apply Stages")
+
+        # Save updated stages only when the form is submitted
+        if submitted:
+            st.session_state.interview_stages = new_stages
+
+        return st.session_state.interview_stages
     
     def load_data(self, stages):
         """Allow users to upload historical recruitment data"""
@@ -66,87 +285,64 @@ class FlexibleRecruitmentPipelineTool:
         
         if uploaded_file is not None:
             try:
-                # Read the CSV file
-                df = pd.read_csv(uploaded_file)
-                
-                # Validate DataFrame columns
+                # The raw bytes key the cached parse below
+                raw_bytes = uploaded_file.getvalue()
+
+                # Validate columns against the header before parsing the body
                 required_columns = ['Year'] + stages
-                
-                # Check if all required columns exist
-                if all(col in df.columns for col in required_columns):
-                    # Select only the relevant columns
-                    df = df[required_columns]
-                    st.session_state.historical_data = df
-                    st.sidebar.success("Data successfully uploaded!")
-                    return df
-                else:
-                    missing_cols = [col for col in required_columns if col not in df.columns]
+                file_columns = frozenset(pd.read_csv(io.BytesIO(raw_bytes), nrows=0).columns)
+
+                missing_cols = [col for col in required_columns if col not in file_columns]
+                if missing_cols:
                     st.sidebar.error(f"Missing columns: {', '.join(missing_cols)}")
                     return None
+
+                # Parse into a structure-of-arrays dict, cached on the bytes
+                historical = _parse_upload(raw_bytes, tuple(stages))
+                st.session_state.historical_data = historical
+                st.sidebar.success("Data successfully uploaded!")
+                return historical
             except Exception as e:
                 st.sidebar.error(f"Error loading file: {e}")
                 return None
         
         return None
     
-    def calculate_conversion_rates(self, df, stages):
-        """Calculate conversion rates between recruitment stages"""
-        if df is None or len(stages) < 2:
-            return {}
-        
-        rates = {}
-        for i in range(len(stages) - 1):
-            from_stage = stages[i]
-            to_stage = stages[i+1]
-            
-            try:
-                conversion_rate = (df[to_stage].mean() / df[from_stage].mean()) * 100
-                rates[f"{from_stage} to {to_stage}"] = conversion_rate
-            except ZeroDivisionError:
-                rates[f"{from_stage} to {to_stage}"] = 0
-        
-        return rates
-    
-    def project_pipeline(self, df, target_final_stage, stages):
+    def project_pipeline(self, target_final_stage, stages, rates):
         """Project pipeline volumes based on historical conversion rates"""
-        # Calculate conversion rates
-        rates = self.calculate_conversion_rates(df, stages)
-        
-        # Start from the target and work backwards
-        projection = {stages[-1]: target_final_stage}
-        
-        # Reverse calculate required volumes through stages
-        for i in range(len(stages) - 1, 0, -1):
-            from_stage = stages[i-1]
-            to_stage = stages[i]
-            
-            rate_key = f"{from_stage} to {to_stage}"
-            if rate_key in rates and rates[rate_key] > 0:
-                required_volume = projection[to_stage] / (rates[rate_key] / 100)
-                projection[from_stage] = required_volume
-        
+        # Integer targets in range come straight from the precomputed batch;
+        # anything else goes through the projection kernel directly
+        target = int(target_final_stage)
+        if target == target_final_stage and 1 <= target <= _MAX_TARGET:
+            volumes = _all_projections(tuple(rates.values()), _MAX_TARGET)[target - 1]
+        else:
+            rates_array = np.fromiter(rates.values(), dtype=np.float64, count=len(rates))
+            targets = np.array([target_final_stage], dtype=np.float64)
+            volumes = _project_batch(rates_array, targets)[0]
+
+        projection = dict(zip(stages, volumes.tolist()))
+
         # Add conversion rates to projection
         projection['Conversion Rates'] = rates
-        
+
         return projection
     
     def generate_projection_csv(self, projection, stages):
         """Generate a CSV file for download with projection data"""
-        # Create DataFrame from projection
-        projection_df = pd.DataFrame([projection])
-        
-        # Separate conversion rates
-        conversion_rates = projection_df['Conversion Rates'].iloc[0]
-        projection_df = projection_df.drop('Conversion Rates', axis=1)
-        
-        # Add conversion rates as additional columns
-        for rate_name, rate_value in conversion_rates.items():
-            projection_df[f'Conversion Rate - {rate_name}'] = rate_value
-        
-        # Create a buffer to store our CSV
+        # Build the one-row CSV directly instead of round-tripping a DataFrame;
+        # csv.writer quotes fields, since stage names are free-text
+        conversion_rates = projection['Conversion Rates']
+
         csv_buffer = io.StringIO()
-        projection_df.to_csv(csv_buffer, index=False)
-        
+        writer = csv.writer(csv_buffer)
+        writer.writerow(
+            list(stages) + [f'Conversion Rate - {name}' for name in conversion_rates]
+        )
+        writer.writerow(
+            [f'{projection[stage]:.6f}' for stage in stages]
+            + [f'{rate:.6f}' for rate in conversion_rates.values()]
+        )
+
         # Create download button
         st.download_button(
             label="Download Projection as CSV",
@@ -156,50 +352,32 @@ class FlexibleRecruitmentPipelineTool:
             key="download_projection_csv"
         )
     
-    def visualize_pipeline(self, historical_df, projection, stages):
+    def visualize_pipeline(self, historical, projection, stages):
         """Create interactive visualizations of historical and projected data"""
-        # Historical Data Line Chart
-        historical_fig = px.line(
-            historical_df, 
-            x='Year', 
-            y=stages,
-            title='Recruitment Pipeline Changes Over Time',
-            labels={'value': 'Number of Candidates', 'variable': 'Stage'}
+        # Hashable projection items (stage order preserved for the bar chart)
+        projection_items = tuple(
+            (stage, round(projection[stage], 6)) for stage in stages
         )
-        
-        # Update x-axis to show every 1 year
-        historical_fig.update_xaxes(
-            tick0=historical_df['Year'].min(), # Starting point for the ticks
-            dtick=1 # Interval between ticks (1 year)
-            )
 
-        historical_fig.update_yaxes(
-            dtick=200,
-            tickcolor="white",
-            gridcolor = "grey"
-            )
-        # Projection Bar Chart
-        projection_df = pd.DataFrame([projection])
-        projection_df = projection_df.drop('Conversion Rates', axis=1)
-        
-        projection_long = projection_df.melt(
-            var_name='Stage', 
-            value_name='Candidates',
-            value_vars=list(projection_df.columns)
+        # Reuse the previously rendered figures when the inputs are unchanged,
+        # skipping figure construction and re-serialization entirely
+        fig_key = (
+            _hash_array(historical['year']),
+            _hash_array(historical['stages_matrix']),
+            tuple(stages),
+            projection_items,
         )
-        
-        projection_fig = px.bar(
-            projection_long, 
-            x='Stage', 
-            y='Candidates',
-            title='Projected Recruitment Pipeline',
-            labels={'Candidates': 'Number of Candidates'}
+        if st.session_state.get('_fig_key') == fig_key:
+            return st.session_state['_fig_hist'], st.session_state['_fig_proj']
+
+        historical_fig = _build_historical_fig(
+            historical['year'], historical['stages_matrix'], tuple(stages)
         )
-        
-        projection_fig.update_yaxes(
-            tickcolor="white",
-            gridcolor = "grey"
-            )
+        projection_fig = _build_projection_fig(projection_items)
+
+        st.session_state['_fig_key'] = fig_key
+        st.session_state['_fig_hist'] = historical_fig
+        st.session_state['_fig_proj'] = projection_fig
 
         return historical_fig, projection_fig
     
@@ -211,36 +389,50 @@ class FlexibleRecruitmentPipelineTool:
         stages = self.configure_stages()
         
         # Load historical data
-        historical_df = self.load_data(stages)
-        
-        if historical_df is not None:
+        historical = self.load_data(stages)
+
+        if historical is not None:
             # Conversion Rates Display
             st.sidebar.header("Conversion Rates")
-            rates = self.calculate_conversion_rates(historical_df, stages)
-            for stage, rate in rates.items():
-                st.sidebar.metric(stage, f"{rate:.2f}%")
+            rates = _conv_rates(historical['stages_matrix'], tuple(stages))
+            with st.sidebar:
+                components.html(
+                    _rates_html(tuple(rates.items())),
+                    height=70 * len(rates)
+                )
             
             # Projection Inputs
             st.sidebar.header("Projection Parameters")
             target_final_stage = st.sidebar.number_input(
-                f"Target Number of {stages[-1]}", 
-                min_value=1, 
+                f"Target Number of {stages[-1]}",
+                min_value=1,
                 value=10
             )
             
             # Generate Projection
             if st.sidebar.button("Generate Projection"):
-                # Project pipeline
-                projection = self.project_pipeline(
-                    historical_df, target_final_stage, stages
+                # Reuse the last projection when data, stages and target
+                # are unchanged since the previous click
+                proj_sig = (
+                    _hash_array(historical['stages_matrix']),
+                    target_final_stage,
+                    tuple(stages),
                 )
-                
+                cached_projection = st.session_state.get('_proj_cache')
+                if cached_projection is not None and cached_projection[0] == proj_sig:
+                    projection = cached_projection[1]
+                else:
+                    projection = self.project_pipeline(
+                        target_final_stage, stages, rates
+                    )
+                    st.session_state['_proj_cache'] = (proj_sig, projection)
+
                 # Store projection in session state
                 st.session_state.projection_results = projection
                 
                 # Visualizations
                 historical_fig, projection_fig = self.visualize_pipeline(
-                    historical_df, projection, stages
+                    historical, projection, stages
                 )
                 
                 st.plotly_chart(historical_fig)